@@ -6,6 +6,7 @@ One for authentication, one for reading and one for uploading.
 import datetime as dt
 import pandas as pd
 import gspread
+from gspread.utils import numericise_all
 from google.oauth2.service_account import Credentials
 
 
@@ -33,8 +34,20 @@ def google_authentication(credentials, sheet_id) -> object:
 
 
 def read_from_google(sheet) -> pd.DataFrame:
-    """ This function reads the data from the Google Sheet. """
-    df_previous = pd.DataFrame(data=sheet.get_all_records())
+    """ This function reads the data from the Google Sheet.
+
+    The values are read as a list of rows, the first one being the header.
+    An empty sheet (no data below the header) gives an empty DataFrame.
+
+    """
+    rows = sheet.get_all_values()
+    if len(rows) <= 1:
+        return pd.DataFrame()
+
+    # convert numeric strings back to numbers, as get_all_records() did
+    df_previous = pd.DataFrame(
+        data=[numericise_all(row) for row in rows[1:]],
+        columns=rows[0])
     return df_previous
 
 
@@ -46,18 +59,14 @@ def upload_to_google(df, sheet):
 
     """
 
-    # Convert the DataFrame to a list of lists
-    data = df.values.tolist()
+    # Convert the DataFrame headers and data to a list of lists
+    payload = [df.columns.tolist()] + df.values.tolist()
 
     # Clear existing data and update the Google Sheet with new data
     sheet.clear()
 
-    # Convert the DataFrame headers to a list and insert as the first row
-    header_row = df.columns.tolist()
-    sheet.insert_rows([header_row], row=1)
-
-    # insert the full data
-    sheet.insert_rows(data, row=2)
+    # write the headers and the full data in a single request
+    sheet.update(range_name='A1', values=payload, value_input_option='RAW')
 
 
 def copy_spreadsheet(credentials, sheet_id_to_copy):
@@ -0,0 +1,324 @@
+""" Script containing the property page parsing functions.
+
+They take the elements of a property page, parsed by selectolax, and
+return the features written to the Google Sheet.
+
+"""
+
+# pylint: disable=broad-except
+# pylint: disable=import-error
+import re
+import logging
+
+logger = logging.getLogger()
+
+# numbers (digits and dots) inside a price string
+_PRICE_RE = re.compile(r'[\d.]+')
+
+# second line of a description item, where its value is written
+_FIELD_RE = re.compile(r'\n([^\n]*)')
+
+# spellings of the furnished description found on the website
+_FURNISHED_MAP = {
+    'yes': 'Furnished',
+    'furnish': 'Furnished',
+    'full furnished': 'Fully Furnished',
+    'fully': 'Fully Furnished',
+    'full furnish': 'Fully Furnished',
+    'full': 'Fully Furnished',
+    'no furnish': 'Unfurnished',
+    'no': 'Unfurnished',
+    'un-furnish': 'Unfurnished',
+    'semi': 'Semi Furnished',
+    'semi-furnished': 'Semi Furnished',
+    'semi frunished': 'Semi Furnished',
+    'semi furnish': 'Semi Furnished'}
+
+# buckets of property page elements and the selectors they are selected by
+PROPERTY_SELECTORS = {
+    'name': '.name',
+    'code': '.code',
+    'colswidth20': '.colswidth20',
+    'description': '.property-description-row.flexbox',
+    'available': '.available',
+    'facilities': '.flexbox-wrap'}
+
+# whitespace characters BeautifulSoup collapsed in whitespace-only text
+_ASCII_SPACES = ' \t\n\r\f'
+
+
+def node_text(node) -> str:
+    """ This function returns the text of a selectolax node the way
+    BeautifulSoup's .text did, the parsing below relies on it.
+
+    Text made only of whitespace (indentation between tags) is collapsed to
+    a single line break, or to a space when it has no line break.
+
+    """
+    parts = []
+    for text_node in node.traverse(include_text=True):
+        if text_node.tag != '-text':
+            continue
+        text = text_node.text(deep=False)
+        if not text.strip(_ASCII_SPACES):
+            text = '\n' if '\n' in text else ' '
+        parts.append(text)
+
+    return ''.join(parts)
+
+
+def extract_all(tree) -> dict:
+    """ This function collects the elements used by the feature functions,
+    with one selector query per entry of PROPERTY_SELECTORS.
+
+    A grouped query would return the elements grouped by selector rather
+    than in document order, and an element matching two selectors twice.
+    A query per bucket keeps each bucket in document order, with every
+    element once.
+
+    """
+    nodes = {bucket: tree.css(selector)
+             for bucket, selector in PROPERTY_SELECTORS.items()}
+
+    return nodes
+
+
+def get_shared_features(nodes):
+    """ This function obtains the elements that are common for both villas and
+    lands.
+
+    It takes the elements collected by extract_all() and returns:
+
+    - colswidth20_item: a variable that is used later one
+    - type_sale: the type of sale, lease or free
+    - hold_years: the number of lease years
+    - description_items: a list that is used later on to get more features.
+    - date: the date of the upload, by using the image src
+
+    """
+
+    # get elements inside colswidth20
+    colswidth20_items = nodes['colswidth20']
+    colswidth20_item = [
+        node_text(colswidth20_item).strip()
+        for colswidth20_item in colswidth20_items]
+
+    # get sale type for each property
+    type_sale = colswidth20_item[1] \
+        .split('\n', 3)[2].split(' ', 1)[0] + "hold"
+
+    # get location
+    location = colswidth20_item[0].rpartition('\n')[2]
+    if '-' in location:
+        location = 'Unknown'
+
+    # get years if lease
+    if type_sale == 'leasehold':
+        hold_years = colswidth20_item[1] \
+            .split('\n', 4)[3].split('/ ', 2)[1]
+        hold_years = int(hold_years.split(' y', 1)[0])
+    else:
+        hold_years = 0
+
+    # get items of property's description
+    property_description = nodes['description']
+    description_items = []
+
+    # list items organized by "p" element
+    for desc_row in property_description:
+        items = desc_row.css('p')
+        for paragraph in items:
+            description_items.append(
+                node_text(paragraph).strip())
+
+    return type_sale, hold_years, description_items, location
+
+
+def _is_available(icon) -> bool:
+    """ This function tells if a facility element, or one of its children,
+    has the 'available' class, without serializing it back to HTML. """
+    classes = (icon.attributes.get('class') or '').split()
+    return 'available' in classes or icon.css_first('.available') is not None
+
+
+def get_rooms_and_pool(nodes):
+    """ This function takes the elements collected by extract_all() and
+    scrapes content regarding the bedrooms, bathrooms and Pool.
+
+    It is mainly used to avoid repetion in two functions that require
+    these features.
+    """
+    # get bedrooms and bathrooms
+    rooms = [node_text(paragraph).strip()
+             for items in nodes['available']
+             for paragraph in items.iter(include_text=True)]
+
+    bedrooms = int(rooms[3].split('\n', 2)[1])
+    bathrooms = int(rooms[5])
+
+    # check for an available pool, stopping at the first one found
+    has_pool = any(node_text(icon) == '\npoolPool'
+                   for facility in nodes['facilities']
+                   for icon in facility.css('p')
+                   if _is_available(icon))
+
+    if has_pool:
+        pool = 'yes'
+    else:
+        pool = 'no'
+
+    return bedrooms, bathrooms, pool
+
+
+def _price_number(price_string) -> int:
+    """ This function joins the digits of a price string into an integer,
+    dropping the currency and the thousands separators. """
+    return int(''.join(_PRICE_RE.findall(price_string)))
+
+
+def _field_value(description_item) -> str:
+    """ This function returns the value of a description item, the stripped
+    text of its second line.
+
+    It raises a ValueError when the item has a single line, like the
+    IndexError of split('\\n')[1] did.
+
+    """
+    match = _FIELD_RE.search(description_item)
+    if match is None:
+        raise ValueError(f"no value in {description_item!r}")
+    return match.group(1).strip()
+
+
+def field_float(description_item) -> float:
+    """ This function returns the value of a description item as a float.
+
+    Like float(item.split('\\n')[1].strip()), it raises a ValueError when
+    the item has a single line or its value is not a plain number, so the
+    callers can fall back to another item.
+
+    """
+    return float(_field_value(description_item))
+
+
+def _normalize_furnished(description_item) -> str:
+    """ This function maps the furnished description of a villa to one of
+    the canonical values, or returns the raw value when it is not known. """
+    furnished = _field_value(description_item)
+    return _FURNISHED_MAP.get(furnished.lower(), furnished)
+
+
+def get_only_villas_features(nodes, description_items, prices, prices_usd):
+    """ This function returns only the elements that are specific for villas.
+    """
+
+    # get bedrooms, bathrooms and pool
+    bedrooms, bathrooms, pool = get_rooms_and_pool(nodes)
+
+    # if it finds the "Year Built" add it
+    if 'Year Built' in description_items[5]:
+        year_built = description_items[5]
+        year_built = year_built.split(': ', 2)[1]
+        land_size = field_float(description_items[3])
+        building_size = field_float(description_items[6])
+        furnished_index = 7
+
+    else:
+        year_built = "Unknown"
+        land_size = field_float(description_items[3])
+        building_size = field_float(description_items[5])
+        furnished_index = 6
+
+    try:
+        furnished = _normalize_furnished(description_items[furnished_index])
+    except Exception as error:
+        furnished = "Unknown"
+        logger.error('%s: FIXED', str(error))
+        logger.info('furnished fixed!')
+
+    def get_price_parameters(prices):
+        try:
+            price = node_text(prices[0]).strip() if prices else ''
+            price = _price_number(price)
+            payment_period = 'one time'
+        except Exception as error:
+            price = 0
+            payment_period = 'on request'
+            logger.error('%s: FIXED', str(error))
+
+        return price, payment_period
+
+    price_usd, payment_period_usd = get_price_parameters(prices_usd)
+    price, payment_period = get_price_parameters(prices)
+
+    return price, price_usd, \
+        payment_period, payment_period_usd, \
+        year_built, land_size, building_size, \
+        pool, furnished, bedrooms, bathrooms
+
+
+def get_only_villas_rents_features(nodes, description_items):
+    """ This function returns only the elements that are specific for
+    villas rents.
+    """
+
+    # get bedrooms, bathrooms and pool
+    bedrooms, bathrooms, pool = get_rooms_and_pool(nodes)
+
+    try:
+        land_size = field_float(description_items[3])
+        building_size = field_float(description_items[4])
+    except Exception as error:
+        building_size = field_float(description_items[5])
+        logger.error('%s: FIXED', str(error))
+
+    return land_size, building_size, pool, bedrooms, bathrooms
+
+
+def get_renting_prices_periods(prices, prices_usd, property_type) -> str:
+    """ This function returns only the elements that are specific for lands.
+    They might be the same as the ones for villas, but the scraping process
+    changes.
+
+    It takes the 'prices' object and applies transformation to obtain the
+    desired output, a string.
+
+    """
+
+    def get_price_parameters(prices, property_type):
+        raw_string = node_text(prices[0]).strip() if prices else ''
+        if property_type == 'villas':
+            try:
+                price = _price_number(raw_string.partition('/')[0])
+                if "\n" in raw_string:
+                    payment_period = raw_string.split("\n", 2)[1]\
+                        .split('/', 2)[1].strip()
+                else:
+                    payment_period = raw_string.split('/', 2)[1].strip()
+            except Exception as error:
+                price = 0
+                payment_period = 'on request'
+                logger.error('%s :FIXED', str(error))
+        else:
+            try:
+                # the price is on the first line, with an optional period
+                # after a slash
+                parts = raw_string.partition("\n")[0].split("/", 2)
+                price = _price_number(parts[0])
+                payment_period = parts[1] if len(parts) > 1 else 'one time'
+
+            except Exception as error:
+                price = 0
+                payment_period = 'on request'
+                logger.error('%s :FIXED', str(error))
+
+        return price, payment_period
+
+    price_usd, payment_period_usd = get_price_parameters(
+        prices_usd,
+        property_type)
+    price, payment_period = get_price_parameters(
+        prices,
+        property_type)
+
+    return price, price_usd, payment_period, payment_period_usd
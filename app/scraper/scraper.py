@@ -3,99 +3,187 @@
 # pylint: disable=broad-except
 # pylint: disable=import-error
 import os
-import time
+import csv
+import json
+import random
+import asyncio
+import functools
 import logging
-import re
+import sys
 import datetime as dt
 from dotenv import load_dotenv
-from playwright.sync_api import sync_playwright
+from playwright.async_api import async_playwright
+from playwright.async_api import Error as PlaywrightError
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+from gspread.utils import numericise_all
+from selectolax.lexbor import LexborHTMLParser
 from google_access import pd, google_authentication
 from google_access import upload_to_google, read_from_google
-from bs4 import BeautifulSoup
+from property_parsing import PROPERTY_SELECTORS, node_text, field_float
+from property_parsing import extract_all, get_shared_features
+from property_parsing import get_only_villas_features
+from property_parsing import get_only_villas_rents_features
+from property_parsing import get_renting_prices_periods
+
+# the elements of every bucket, to serialize from a property page
+_PROPERTY_SELECTOR = ', '.join(PROPERTY_SELECTORS.values())
+
+# outer HTML of the outermost elements matching a selector, nested matches
+# are already part of their ancestor's HTML
+_OUTERMOST_HTML_JS = (
+    "(elements, selector) => elements"
+    ".filter(e => !(e.parentElement && e.parentElement.closest(selector)))"
+    ".map(e => e.outerHTML)")
+
+# resource types and url parts of the requests the scraper does not need
+_BLOCKED_RESOURCES = {'image', 'media', 'font'}
+_BLOCKED_URLS = ('analytics', 'googletagmanager')
+
+# milliseconds to wait for a page navigation, which only waits for the DOM
+_GOTO_TIMEOUT = 15000
+
+# Chromium flags turning off the features a headless scraper does not use
+_LAUNCH_ARGS = [
+    '--disable-gpu',
+    '--disable-dev-shm-usage',
+    '--disable-extensions',
+    '--disable-background-networking',
+    '--disable-default-apps',
+    '--disable-sync',
+    '--mute-audio',
+    '--no-first-run']
+
+
+async def block_unused_requests(route):
+    """ This function aborts the requests the scraper does not need (images,
+    fonts, media and analytics) and lets the others continue.
+
+    Stylesheets and scripts are kept, the currency dropdown needs them.
 
+    """
+    request = route.request
+    if request.resource_type in _BLOCKED_RESOURCES \
+            or any(part in request.url for part in _BLOCKED_URLS):
+        await route.abort()
+    else:
+        await route.continue_()
+
+
+async def new_scraping_context(browser):
+    """ This function creates a browser context whose pages do not download
+    the resources blocked by block_unused_requests(), and give up on a
+    navigation after _GOTO_TIMEOUT milliseconds.
+
+    Service workers are blocked, otherwise their requests would not go
+    through the route.
 
-def get_last_page_number(page, url) -> int:
+    """
+    context = await browser.new_context(service_workers='block')
+    context.set_default_navigation_timeout(_GOTO_TIMEOUT)
+    await context.route('**/*', block_unused_requests)
+    return context
+
+
+async def get_last_page_number(page, url) -> int:
     """This function looks for the last page to scrape.
 
     By looking for the pagination id, it finds the page-item elements.
-    These are converted to a list, then the function takes the
-    last number shown on the pagination.
+    The text of the second to last one is the last number shown on the
+    pagination, read directly from the page without parsing its HTML.
 
     """
     # go to url with Playwright page element
-    page.goto(url)
+    await page.goto(url, wait_until='domcontentloaded')
+
+    # locate the "page-item" elements inside the #pagination id
+    page_items = page.locator('#pagination li.page-item')
 
-    # tackle only the #box id
-    html = page.inner_html('#pagination')
+    return int((await page_items.nth(-2).inner_text()).strip())
 
-    # create beautiful soup element
-    soup = BeautifulSoup(html, 'html.parser')
 
-    # Find all elements with the class "box property-item"
-    page_items = soup.find_all('li', {'class': 'page-item'})
+async def get_page_counts(browser, urls, cache_file) -> list:
+    """ This function returns the last page number of each url.
 
-    return int(page_items[-2].text)
+    The numbers are cached by day in a JSON file, so the runs of the same day
+    skip the pagination pages. The urls that are not cached yet are fetched
+    concurrently, with one browser page each.
 
+    """
+    today = str(dt.date.today())
+    try:
+        with open(cache_file, encoding='utf-8') as file:
+            page_counts = json.load(file).get(today, {})
+    except (OSError, ValueError):
+        page_counts = {}
+
+    missing_urls = [url for url in urls if url not in page_counts]
+    if missing_urls:
+        context = await new_scraping_context(browser)
+        try:
+            pages = await asyncio.gather(
+                *[context.new_page() for _ in missing_urls])
+            numbers = await asyncio.gather(
+                *[get_last_page_number(page, url)
+                  for page, url in zip(pages, missing_urls)])
+        finally:
+            await context.close()
+
+        page_counts.update(zip(missing_urls, numbers))
+        with open(cache_file, 'w', encoding='utf-8') as file:
+            json.dump({today: page_counts}, file)
 
-def update_dataframe(df, df_previous) -> pd.DataFrame:
+    return [page_counts[url] for url in urls]
+
+
+def update_dataframe(df, df_previous, now_str) -> pd.DataFrame:
     """This function takes new and old datasets and updates the
-    old dataset with new data while preserving specific columns."""
+    old dataset with new data while preserving specific columns.
+
+    now_str is the scrape date written to the new rows.
+
+    """
 
     logger.info(df_previous)
     logger.info(df_previous.shape)
 
     if df_previous.empty:  # First-time scrape
-        df['First Scrape Date'] = dt.datetime.now().strftime(
-            '%Y-%m-%d %H:%M:%S')
-        df['Last Scrape Date'] = df['First Scrape Date']
+        df['First Scrape Date'] = now_str
+        df['Last Scrape Date'] = now_str
         df['Original Price (USD)'] = df['Last Price (USD)']
         df['Original Price (IDR)'] = df['Last Price (IDR)']
     else:  # Subsequent scrapes
         logger.info("The Google Sheet is not empty!")
-        df['Last Scrape Date'] = dt.datetime.now().strftime(
-            '%Y-%m-%d %H:%M:%S')
-
-        # Merge the dataframes on 'Code'
-        columns_to_preserve = [
-            'Code',
-            'First Scrape Date',
-            'Original Price (USD)',
-            'Original Price (IDR)']
-        df_merged = pd.merge(
-            df,
-            df_previous[columns_to_preserve],
-            on='Code',
-            how='left')
+        df['Last Scrape Date'] = now_str
+
+        # Index both dataframes by 'Code' and reindex them to the union of
+        # codes and columns, so they can be compared cell by cell
+        df_new = df.drop_duplicates(subset='Code').set_index('Code')
+        df_old = df_previous.drop_duplicates(subset='Code').set_index('Code')
+        all_codes = df_new.index.union(df_old.index)
+        all_columns = df_new.columns.union(df_old.columns, sort=False)
+        df_new_all = df_new.reindex(index=all_codes, columns=all_columns)
+        df_old_all = df_old.reindex(index=all_codes, columns=all_columns)
+
+        # Let the new values win over the old ones, the preserved columns
+        # are empty in the new dataframe
+        df_merged = df_new_all.where(df_new_all.notna(), df_old_all)
 
         logger.info(df_merged)
 
-        # Define a function to fill NaN values in specific columns with values
-        # from the same row
-        def fillna_from_same_row(row):
-            if pd.isna(row['First Scrape Date']):
-                row['First Scrape Date'] = row['Last Scrape Date']
-            if pd.isna(row['Original Price (USD)']):
-                row['Original Price (USD)'] = row['Last Price (USD)']
-            if pd.isna(row['Original Price (IDR)']):
-                row['Original Price (IDR)'] = row['Last Price (IDR)']
-            return row
-
-        # Apply the fillna_from_same_row function row-wise to fill NaN values
-        df_merged = df_merged.apply(fillna_from_same_row, axis=1)
-
-        # Concatenate the dataframes and drop duplicates based on 'Code'
-        df_concatenated = pd.concat(
-            [df_merged, df_previous], ignore_index=True)
-        df_concatenated = df_concatenated.drop_duplicates(
-            subset='Code').reset_index(drop=True)
-
-        logger.info(df_concatenated)
-
-        df_concatenated.loc[
-            ~df_concatenated['Code'].isin(
-                df_merged['Code']), 'Listed'] = 'Unlisted'
-
-        df = df_concatenated.sort_values('First Scrape Date', ascending=False)
+        # Fill NaN values of new properties with the values from the same row
+        df_merged['First Scrape Date'] = df_merged[
+            'First Scrape Date'].fillna(df_merged['Last Scrape Date'])
+        df_merged['Original Price (USD)'] = df_merged[
+            'Original Price (USD)'].fillna(df_merged['Last Price (USD)'])
+        df_merged['Original Price (IDR)'] = df_merged[
+            'Original Price (IDR)'].fillna(df_merged['Last Price (IDR)'])
+
+        # Codes missing from the new scrape are no longer listed
+        unlisted = df_new.index.get_indexer(df_merged.index) == -1
+        df_merged.loc[unlisted, 'Listed'] = 'Unlisted'
+
+        df = df_merged.reset_index().sort_values(
+            'First Scrape Date', ascending=False)
         df.reset_index(inplace=True, drop=True)
         logger.info(df.shape)
         logger.info(df)
@@ -103,44 +191,45 @@ def update_dataframe(df, df_previous) -> pd.DataFrame:
     return df
 
 
-def obtain_links(page, base_url, website_page) -> list:
+async def obtain_links(page, base_url, website_page) -> list:
     """ This function returns a list of properties links that are displayed
     in a page.
 
     It takes the URL and the page number, and looks for the #box id element.
-    Then it creates a beautiful soup element (soup) and scrapes the 'href'
-    elements (links) that are inside the '.box.property-item' class.
+    The 'href' of the first link inside each '.box.property-item' class is
+    read in the browser, so the listing HTML is never parsed.
     """
     # makes the url to be scraped, with the base url and the website page
     page_section = f"?page={website_page + 1}"
     url = base_url + page_section
 
     # go to url with Playwright page element
-    page.goto(url)
+    await page.goto(url, wait_until='domcontentloaded')
 
-    # tackle only the #box id
-    html = page.inner_html('#box')
+    # wait for the #box id to be attached
+    await page.wait_for_selector('#box', state='attached')
 
-    # create beautiful soup element
-    soup = BeautifulSoup(html, 'html.parser')
+    return await page.eval_on_selector_all(
+        '#box .box.property-item',
+        "items => items.map(item => "
+        "item.querySelector('a').getAttribute('href'))")
 
-    # Extract the "href" attributes from the links
-    return [item.find('a')['href'] for item in
-            soup.select('.box.property-item')]
 
+async def goto_and_get_tree(page, property_link) -> object:
+    """ This function takes the property link and returns a selectolax
+    tree of the property elements, together with the listing status.
 
-def change_currency_n_get_soup(page, property_link,
-                               currency='USD', idr_flag=0) -> object:
-    """ This function takes the property link and returns a beautiful soup
-    element.
+    Only the elements matched by _PROPERTY_SELECTOR are serialized and
+    parsed, not the whole page body.
 
-    At first it goes to link, then it clicks on the '.header-cur' class
-    with the Playwright page method, it locates the text IDR or USD and clicks
-    to change the currency. Finally it creates the soup element.
+    The property is considered unlisted when the website redirects the link
+    somewhere else, the redirected page has no property details to wait for.
+    A listed page whose details do not show up in time raises a Playwright
+    timeout, which is retried by fetch_property().
 
     """
     # go to new url provided by the link
-    page.goto(property_link)
+    await page.goto(property_link, wait_until='domcontentloaded')
 
     # check if property is listed
     is_listed = 'Listed'
@@ -150,511 +239,502 @@ def change_currency_n_get_soup(page, property_link,
     if current_url != property_link:
         is_listed = 'Unlisted'
 
+    # wait for the property details to be in the DOM
+    if is_listed == 'Listed':
+        await page.wait_for_selector(
+            '.code', state='attached', timeout=_GOTO_TIMEOUT)
+
+    # serialize only the property elements
+    html = ''.join(await page.eval_on_selector_all(
+        _PROPERTY_SELECTOR, _OUTERMOST_HTML_JS, _PROPERTY_SELECTOR))
+
+    return LexborHTMLParser(html), is_listed
+
+
+async def toggle_currency_and_get_prices(
+        page, currency='USD', idr_flag=0) -> list:
+    """ This function changes the currency of the current page and returns
+    the '.regular-price' elements.
+
+    It clicks on the '.header-cur' class with the Playwright page method,
+    it locates the text IDR or USD and clicks to change the currency.
+    Only the price elements are parsed, not the full page.
+
+    """
     # Click on the currency dropdown
-    page.click('.header-cur')
+    await page.click('.header-cur')
 
     # locate the currency IDR or USD and click
     if currency == 'USD':
         if idr_flag == 1:
-            page.locator(f"text={currency}").nth(1).click()
+            await page.locator(f"text={currency}").nth(1).click()
         else:
-            page.locator(f"text={currency}").nth(2).click()
+            await page.locator(f"text={currency}").nth(2).click()
 
     else:
-        page.locator(f"text={currency}").nth(0).click()
+        await page.locator(f"text={currency}").nth(0).click()
 
-    return BeautifulSoup(page.inner_html('body'), 'html.parser'), is_listed
+    # serialize only the price elements
+    html = ''.join(await page.eval_on_selector_all(
+        '.regular-price', 'elements => elements.map(e => e.outerHTML)'))
 
+    return LexborHTMLParser(html).css('.regular-price')
 
-def get_shared_features(soup):
-    """ This function obtains the elements that are common for both villas and
-    lands.
 
-    It looks for several HTML classes and elements and returns:
+def gen_detail_dict(
+    title, price_usd, price, payment_period_usd, payment_period,
+    code, location, type_sale, hold_years, link, property_type, year_built,
+        bedrooms, bathrooms, land_size,
+        building_size, pool, furnished, is_listed) -> dict:
+    """ This function returns a dictionary with all the information
+    to be uploaded on the Google Sheets.
 
-    - colswidth20_item: a variable that is used later one
-    - type_sale: the type of sale, lease or free
-    - hold_years: the number of lease years
-    - description_items: a list that is used later on to get more features.
-    - date: the date of the upload, by using the image src
+    Location, type of sale and furnished repeat across many listings, so
+    they are interned to share a single string object per value."""
 
-    """
+    return {
+        'Title': title,
+        'Listed': is_listed,
+        'Last Price (USD)': price_usd,
+        'Last Price (IDR)': price,
+        'Payment Period (USD)': payment_period_usd,
+        'Payment Period (IDR)': payment_period,
+        'Code': code,
+        'Location': sys.intern(location),
+        'Type of Sale': sys.intern(type_sale),
+        'Lease Years': hold_years,
+        'URL': link,
+        'Property Type': property_type,
+        'Year Built': year_built,
+        'Bedrooms': bedrooms,
+        'Bathrooms': bathrooms,
+        'Land Size (are)': land_size,
+        'Building Size (sqm)': building_size,
+        'Pool': pool,
+        'Furnished': sys.intern(' '.join(
+            [item.capitalize() for item in furnished.split(' ')]))
+    }
 
-    # get elements inside colswidth20
-    colswidth20_items = soup.select('.colswidth20')
-    colswidth20_item = [
-        colswidth20_item.text.strip()
-        for colswidth20_item in colswidth20_items]
-
-    # get sale type for each property
-    type_sale = colswidth20_item[1] \
-        .split('\n')[2].split(' ')[0] + "hold"
-
-    # get location
-    location = colswidth20_item[0].split('\n')[-1]
-    if '-' in location:
-        location = 'Unknown'
-
-    # get years if lease
-    if type_sale == 'leasehold':
-        hold_years = colswidth20_item[1] \
-            .split('\n')[3].split('/ ')[1]
-        hold_years = int(hold_years.split(' y')[0])
-    else:
-        hold_years = 0
 
-    # get items of property's description
-    property_description = soup.select(
-        '.property-description-row.flexbox')
-    description_items = []
+def _handle_villa_sale(elements, listing) -> dict:
+    """ This function returns the dictionary of a villa for sale. """
+    price, price_usd, payment_period, payment_period_usd, \
+        year_built, land_size, building_size, \
+        pool, furnished, bedrooms, \
+        bathrooms = get_only_villas_features(
+            elements['nodes'], elements['description_items'],
+            elements['prices'], elements['prices_usd'])
+
+    return gen_detail_dict(
+        **listing, price_usd=price_usd, price=price,
+        payment_period_usd=payment_period_usd, payment_period=payment_period,
+        property_type='villa', year_built=year_built,
+        bedrooms=bedrooms, bathrooms=bathrooms,
+        land_size=land_size, building_size=building_size,
+        pool=pool, furnished=furnished)
+
+
+def _handle_villa_rent(elements, listing) -> dict:
+    """ This function returns the dictionary of a villa for rent, which has
+    no type of sale nor lease years. """
+    price, price_usd, payment_period, \
+        payment_period_usd = get_renting_prices_periods(
+            elements['prices'],
+            elements['prices_usd'],
+            'villas')
+
+    land_size, building_size, \
+        pool, bedrooms, \
+        bathrooms = get_only_villas_rents_features(
+            elements['nodes'],
+            elements['description_items'])
+
+    return gen_detail_dict(
+        **{**listing, 'type_sale': "Unknown", 'hold_years': 0},
+        price_usd=price_usd, price=price,
+        payment_period_usd=payment_period_usd, payment_period=payment_period,
+        property_type='villa', year_built="Unknown",
+        bedrooms=bedrooms, bathrooms=bathrooms,
+        land_size=land_size, building_size=building_size,
+        pool=pool, furnished="Unknown")
+
+
+def _handle_land(elements, listing) -> dict:
+    """ This function returns the dictionary of a land. """
+    price, price_usd, payment_period, \
+        payment_period_usd = get_renting_prices_periods(
+            elements['prices'],
+            elements['prices_usd'],
+            'lands')
 
-    # list items organized by "p" element
-    for desc_row in property_description:
-        items = desc_row.find_all('p')
-        for paragraph in items:
-            description_items.append(
-                paragraph.text.strip())
+    try:
+        land_size = field_float(elements['description_items'][3])
+    except Exception as error:
+        land_size = 0.0
+        logger.error("%s : FIXED", str(error))
 
-    return type_sale, hold_years, description_items, location
+    return gen_detail_dict(
+        **listing, price_usd=price_usd, price=price,
+        payment_period_usd=payment_period_usd, payment_period=payment_period,
+        property_type='land', year_built="Unknown", bedrooms=0, bathrooms=0,
+        land_size=land_size, building_size=0.0,
+        pool='No', furnished='Unfurnished')
 
 
-def get_rooms_and_pool(soup):
-    """ This function takes a Beautiful Soup Instance and scrapes content
-    regarding the bedrooms, bathrooms and Pool.
+def get_url_handler(url):
+    """ This function returns the function that builds the dictionary of a
+    property for the kind of properties listed at the url.
+
+    It is called once per scrape, so the url is not checked for every link.
 
-    It is mainly used to avoid repetion in two functions that require
-    these features.
     """
-    # get bedrooms and bathrooms
-    available_items = soup.select('.available')
-    rooms = []
-    for items in available_items:
-        for paragraph in items:
-            rooms.append(paragraph.text.strip())
-
-    bedrooms = int(rooms[3].split('\n')[1])
-    bathrooms = int(rooms[5])
-
-    # check for available facilities
-    facilities = soup.select('.flexbox-wrap')
-    facilities_available = []
-    for facility in facilities:
-        available_icons = facility.find_all('p')
-        for icon in available_icons:
-            if 'available' in str(icon):
-                facilities_available.append(icon.text)
-
-    if '\npoolPool' in facilities_available:
-        pool = 'yes'
-    else:
-        pool = 'no'
+    if 'villas-for-sale' in url:
+        return _handle_villa_sale
+    if 'villas-for-rent' in url:
+        return _handle_villa_rent
+    if 'land' in url:
+        return _handle_land
 
-    return bedrooms, bathrooms, pool
+    raise ValueError(f"No property handler for the url {url}")
 
 
-def get_only_villas_features(soup, description_items, prices, prices_usd):
-    """ This function returns only the elements that are specific for villas.
+def process_link(tree, prices, prices_usd, is_listed, link, handler) -> dict:
+    """ This function builds the dictionary of a property from its parsed
+    page, using the handler returned by get_url_handler().
+
+    The handler gets the parsed elements and prices in one dictionary, and
+    the fields shared by every kind of property in another one, whose keys
+    are the gen_detail_dict() arguments.
+    """
+    # collect the elements used by the feature functions
+    nodes = extract_all(tree)
+
+    # get titles of each property
+    titles = nodes['name']
+    title = node_text(titles[0]).strip() if titles else ''
+
+    # get codes of each property
+    codes = nodes['code']
+    code = node_text(codes[0]).strip() if codes else ''
+
+    type_sale, hold_years, description_items, \
+        location = get_shared_features(nodes)
+
+    elements = {
+        'nodes': nodes,
+        'description_items': description_items,
+        'prices': prices,
+        'prices_usd': prices_usd}
+    listing = {
+        'title': title,
+        'code': code,
+        'location': location,
+        'type_sale': type_sale,
+        'hold_years': hold_years,
+        'link': link,
+        'is_listed': is_listed}
+
+    return handler(elements, listing)
+
+
+def retry_playwright_errors(max_retries):
+    """ This decorator retries a coroutine when it raises a Playwright error
+    (timeouts, navigation), sleeping with an exponential backoff and jitter
+    between the trials. The last error is raised after max_retries retries.
     """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            for retries in range(max_retries + 1):
+                try:
+                    return await func(*args, **kwargs)
+                except (PlaywrightTimeoutError, PlaywrightError) as error:
+                    if retries == max_retries:
+                        raise
+                    logger.info("%s: FAIL", str(error))
+                    logger.info('retrying...')
+                    await asyncio.sleep(
+                        min(30, 0.5 * 2 ** retries) + random.random())
+        return wrapper
+    return decorator
 
-    # get bedrooms, bathrooms and pool
-    bedrooms, bathrooms, pool = get_rooms_and_pool(soup)
-
-    # if it finds the "Year Built" add it
-    if 'Year Built' in description_items[5]:
-        year_built = description_items[5]
-        year_built = year_built.split(': ')[1]
-        land_size = float(
-            description_items[3].split('\n')[1].strip())
-        building_size = float(
-            description_items[6].split('\n')[1].strip())
-        try:
-            furnished = description_items[7]\
-                .split('\n')[1].strip().lower()
-
-            if (furnished.upper() == 'yes'.upper())\
-                    or (furnished.upper() == 'furnish'.upper()):
-                furnished = 'Furnished'
-            if (furnished.upper() == 'full furnished'.upper())\
-                    or (furnished.upper() == 'fully'.upper())\
-                    or (furnished.upper() == 'full furnish'.upper())\
-                    or (furnished.upper() == 'full'.upper()):
-                furnished = 'Fully Furnished'
-            if (furnished.upper() == 'no furnish'.upper())\
-                    or (furnished.upper() == 'no'.upper())\
-                    or (furnished.upper() == 'un-furnish'.upper()):
-                furnished = 'Unfurnished'
-            if (furnished.upper() == 'semi'.upper())\
-                    or (furnished.upper() == 'semi-furnished'.upper())\
-                    or (furnished.upper() == 'semi frunished'.upper())\
-                    or (furnished.upper() == 'semi furnish'.upper()):
-                furnished = 'Semi Furnished'
-
-        except Exception as error:
-            logger.error(error)
-            furnished = "Unknown"
-            logger.info('furnished fixed!')
 
-    else:
-        year_built = "Unknown"
-        land_size = float(
-            description_items[3].split('\n')[1].strip())
-        building_size = float(
-            description_items[5].split('\n')[1].strip())
-        try:
-            furnished = description_items[6]\
-                .split('\n')[1].strip()
-
-            if (furnished.upper() == 'yes'.upper())\
-                    or (furnished.upper() == 'furnish'.upper()):
-                furnished = 'Furnished'
-            if (furnished.upper() == 'full furnished'.upper())\
-                    or (furnished.upper() == 'fully'.upper())\
-                    or (furnished.upper() == 'full furnish'.upper())\
-                    or (furnished.upper() == 'full'.upper()):
-                furnished = 'Fully Furnished'
-            if (furnished.upper() == 'no furnish'.upper())\
-                    or (furnished.upper() == 'no'.upper())\
-                    or (furnished.upper() == 'un-furnish'.upper()):
-                furnished = 'Unfurnished'
-            if (furnished.upper() == 'semi'.upper())\
-                    or (furnished.upper() == 'semi-furnished'.upper())\
-                    or (furnished.upper() == 'semi frunished'.upper())\
-                    or (furnished.upper() == 'semi furnish'.upper()):
-                furnished = 'Semi Furnished'
-
-        except Exception as error:
-            furnished = "Unknown"
-            logger.error('%s: FIXED', str(error))
-            logger.info('furnished fixed!')
-
-    def get_price_parameters(prices):
-        try:
-            price = [price.text.strip() for price in prices][0]
-            price = ''.join(re.findall(r'[\d.]+', price))
-            price = int(price)
-            payment_period = 'one time'
-        except Exception as error:
-            price = 0
-            payment_period = 'on request'
-            logger.error('%s: FIXED', str(error))
-
-        return price, payment_period
-
-    price_usd, payment_period_usd = get_price_parameters(prices_usd)
-    price, payment_period = get_price_parameters(prices)
-
-    return price, price_usd, \
-        payment_period, payment_period_usd, \
-        year_built, land_size, building_size, \
-        pool, furnished, bedrooms, bathrooms
+@retry_playwright_errors(max_retries=5)
+async def fetch_property(page, link, flag):
+    """ This function loads a property page and returns its selectolax tree,
+    its listing status and its prices in USD and IDR. """
+    # make a selectolax tree of the property page
+    tree, is_listed = await goto_and_get_tree(page, link)
 
+    # get the price of each property in USD
+    prices_usd = await toggle_currency_and_get_prices(page, 'USD', flag)
 
-def get_only_villas_rents_features(soup, description_items):
-    """ This function returns only the elements that are specific for
-    villas rents.
-    """
+    # get the price of each property in IDR
+    prices = await toggle_currency_and_get_prices(page, 'IDR', flag)
 
-    # get bedrooms, bathrooms and pool
-    bedrooms, bathrooms, pool = get_rooms_and_pool(soup)
+    return tree, is_listed, prices_usd, prices
 
-    try:
-        land_size = float(
-            description_items[3].split('\n')[1].strip())
-        building_size = float(
-            description_items[4].split('\n')[1].strip())
-    except Exception as error:
-        building_size = float(
-            description_items[5].split('\n')[1].strip())
-        logger.error('%s: FIXED', str(error))
 
-    return land_size, building_size, pool, bedrooms, bathrooms
+async def scrape_link(pool, link, handler) -> dict:
+    """ This function scrapes a property link with a page taken from the
+    pool of pages.
 
+    Playwright errors are retried by fetch_property(), any other exception
+    is a parsing error that will not go away, so the property is skipped.
 
-def get_renting_prices_periods(prices, prices_usd, property_type) -> str:
-    """ This function returns only the elements that are specific for lands.
-    They might be the same as the ones for villas, but the scraping process
-    changes.
+    The pool holds (page, flag) pairs, the flag is used to adapt the currency
+    click and is given back to the pool together with the page.
+    """
+    page, flag = await pool.get()
+    try:
+        tree, is_listed, prices_usd, prices = await fetch_property(
+            page, link, flag)
+        flag = 1
 
-    It takes the 'prices' object and applies transformation to obtain the
-    desired output, a string.
+        detail = process_link(
+            tree, prices, prices_usd, is_listed, link, handler)
 
-    """
+        logger.info("%s: PASS", link)
+        return detail
 
-    def get_price_parameters(prices, property_type):
-        raw_string = [price.text.strip() for price in prices][0].strip()
-        if property_type == 'villas':
-            try:
-                price_string = raw_string.split('/')[0]
-                price = int(''.join(re.findall(r'[\d.]+', price_string)))
-                if "\n" in raw_string:
-                    payment_period = raw_string.split("\n")[1]\
-                        .split('/')[1].strip()
-                else:
-                    payment_period = raw_string.split('/')[1].strip()
-            except Exception as error:
-                price = 0
-                payment_period = 'on request'
-                logger.error('%s :FIXED', str(error))
-        else:
-            try:
-                if "\n" in raw_string:
-                    price_string = raw_string.split("\n")[0]
-                    if "/" in price_string:
-                        price = int(
-                            ''.join(re.findall(r'[\d.]+',
-                                               price_string.split("/")[0])))
-                        payment_period = price_string.split("/")[1]
-                    else:
-                        price = int(
-                            ''.join(re.findall(r'[\d.]+', price_string)))
-                        payment_period = 'one time'
-                else:
-                    if "/" in raw_string:
-                        price = int(
-                            ''.join(re.findall(r'[\d.]+',
-                                               raw_string.split("/")[0])))
-                        payment_period = raw_string.split("/")[1]
-                    else:
-                        price = int(
-                            ''.join(re.findall(r'[\d.]+', raw_string)))
-                        payment_period = 'one time'
-
-            except Exception as error:
-                price = 0
-                payment_period = 'on request'
-                logger.error('%s :FIXED', str(error))
-
-        return price, payment_period
-
-    price_usd, payment_period_usd = get_price_parameters(
-        prices_usd,
-        property_type)
-    price, payment_period = get_price_parameters(
-        prices,
-        property_type)
-
-    return price, price_usd, payment_period, payment_period_usd
+    except (PlaywrightTimeoutError, PlaywrightError) as error:
+        logger.info("%s: FAIL", str(error))
+        logger.info("Max retries reached!")
+        return None
 
+    except Exception:
+        logger.exception("%s: SKIPPED", link)
+        return None
 
-def gen_detail_dict(
-    title, price_usd, price, payment_period_usd, payment_period,
-    code, location, type_sale, hold_years, link, property_type, year_built,
-        bedrooms, bathrooms, land_size,
-        building_size, pool, furnished, is_listed) -> dict:
-    """ This function returns a dictionary with all the information
-    to be uploaded on the Google Sheets."""
+    finally:
+        pool.put_nowait((page, flag))
 
-    return {
-        'Title': title,
-        'Listed': is_listed,
-        'Last Price (USD)': price_usd,
-        'Last Price (IDR)': price,
-        'Payment Period (USD)': payment_period_usd,
-        'Payment Period (IDR)': payment_period,
-        'Code': code,
-        'Location': location,
-        'Type of Sale': type_sale,
-        'Lease Years': hold_years,
-        'URL': link,
-        'Property Type': property_type,
-        'Year Built': year_built,
-        'Bedrooms': bedrooms,
-        'Bathrooms': bathrooms,
-        'Land Size (are)': land_size,
-        'Building Size (sqm)': building_size,
-        'Pool': pool,
-        'Furnished': ' '.join(
-            [item.capitalize() for item in furnished.split(' ')])
-    }
 
+def append_checkpoint(details, checkpoint_file):
+    """ This function appends the dictionaries of scraped properties to a CSV
+    file, writing the header when the file is created. """
+    if not details:
+        return
 
-def scraper(page, url, n_pages=90, flag=0) -> pd.DataFrame:
-    """ This function takes all the other functions to build the scraping
-    process.
+    write_header = not os.path.exists(checkpoint_file)
+    with open(checkpoint_file, 'a', newline='', encoding='utf-8') as file:
+        writer = csv.DictWriter(file, fieldnames=list(details[0]))
+        if write_header:
+            writer.writeheader()
+        writer.writerows(details)
+
+
+def read_checkpoint(checkpoint_file) -> list:
+    """ This function reads back the dictionaries appended to a checkpoint
+    file by append_checkpoint(), or returns an empty list when there is no
+    file.
 
-    It starts by iterating over the website pages (n_pages), then it applies
-    a function step by step until generating a dictionary for either villas
-    or lands.
+    The numeric strings are converted back to numbers, as it is done when
+    reading the Google Sheet. Rows cut short by a crash while writing are
+    left out, so their properties are scraped again.
 
-    Finally it creates a data frame for villas or lands and saves it as a .csv.
     """
+    if not os.path.exists(checkpoint_file):
+        return []
+
     details = []
-    for website_page in range(n_pages):
-        logger.info("Page: %s", website_page)
-        property_links = obtain_links(page, url, website_page)
-        # add retries if it finds exception
-        max_retries = 20
-        for link in property_links:
-            retries = 0
-            while retries <= max_retries:
-                try:
-                    # make a beautiful soup object and convert to USD
-                    soup_usd, is_listed = change_currency_n_get_soup(
-                        page, link, 'USD', flag)
-
-                    # make a beautiful soup object and convert to IDR
-                    soup, is_listed = change_currency_n_get_soup(
-                        page, link, 'IDR', flag)
-                    flag = 1
-
-                    # get the price of each property in IDR
-                    prices_usd = soup_usd.select('.regular-price')
-
-                    # get the price of each property in IDR
-                    prices = soup.select('.regular-price')
-
-                    # get titles of each property
-                    titles = soup.select('.name')
-                    title = [title.text.strip() for title in titles][0]
-
-                    # get codes of each property
-                    codes = soup.select('.code')
-                    code = [code.text.strip() for code in codes][0]
-
-                    type_sale, hold_years, description_items, \
-                        location = get_shared_features(soup)
-
-                    if 'villas-for-sale' in url:
-                        price, price_usd, payment_period, payment_period_usd, \
-                            year_built, land_size, building_size, \
-                            pool, furnished, bedrooms, \
-                            bathrooms = get_only_villas_features(
-                                soup, description_items, prices, prices_usd)
-
-                        detail = gen_detail_dict(
-                            title, price_usd, price, payment_period_usd,
-                            payment_period, code, location, type_sale,
-                            hold_years, link, 'villa', year_built,
-                            bedrooms, bathrooms,
-                            land_size, building_size,
-                            pool, furnished, is_listed)
-
-                        details.append(detail)
-
-                    if 'villas-for-rent' in url:
-                        price, price_usd, payment_period, \
-                            payment_period_usd = get_renting_prices_periods(
-                                prices,
-                                prices_usd,
-                                'villas')
-
-                        land_size, building_size, \
-                            pool, bedrooms, \
-                            bathrooms = get_only_villas_rents_features(
-                                soup,
-                                description_items)
-
-                        detail = gen_detail_dict(
-                            title, price_usd, price, payment_period_usd,
-                            payment_period, code, location, "Unknown", 0,
-                            link, 'villa', "Unknown", bedrooms, bathrooms,
-                            land_size, building_size,
-                            pool, "Unknown", is_listed)
-
-                        details.append(detail)
-
-                    if 'land' in url:
-                        price, price_usd, payment_period, \
-                            payment_period_usd = get_renting_prices_periods(
-                                prices,
-                                prices_usd,
-                                'lands')
-
-                        try:
-                            land_size = float(
-                                description_items[3].split('\n')[1].strip())
-                        except Exception as error:
-                            land_size = 0.0
-                            logger.error("%x : FIXED", str(error))
-
-                        detail = gen_detail_dict(
-                            title, price_usd, price, payment_period_usd,
-                            payment_period, code, location, type_sale,
-                            hold_years, link, 'land', "Unknown", 0, 0,
-                            land_size, 0.0, 'No', 'Unfurnished', is_listed)
-
-                        details.append(detail)
-
-                    logger.info("%s: PASS", link)
-                    break
+    with open(checkpoint_file, newline='', encoding='utf-8') as file:
+        for row in csv.DictReader(file):
+            if None in row or None in row.values():
+                continue
+            details.append(
+                dict(zip(row.keys(), numericise_all(list(row.values())))))
 
-                except Exception as error:
-                    logger.info("%s: FAIL", str(error))
-                    logger.info('retrying...')
-                    retries += 1
-                    time.sleep(10)
+    return details
 
-                if retries > max_retries:
-                    logger.info("Max retries reached!")
-                    continue
 
-    return pd.DataFrame(details)
+async def scraper(browser, url, n_pages=90, n_workers=4,
+                  checkpoint_file=None, done_links=()) -> list:
+    """ This function takes all the other functions to build the scraping
+    process.
+
+    It starts by iterating over the website pages (n_pages), then the
+    property links of each page are scraped concurrently by a pool of
+    n_workers pages, generating a dictionary for either villas or lands.
+
+    The links of the next website page are obtained while the properties
+    of the current one are scraped, and a property link showing up on more
+    than one website page is only scraped once.
 
+    The dictionaries of each website page are appended to checkpoint_file,
+    if given, so the scraped data survives a crash of the run. The links in
+    done_links, already in the checkpoint of a crashed run, are skipped.
 
-def main(url_lands, url_villas, url_villas_rents):
+    Finally it returns the list of dictionaries for villas or lands.
+    """
+    # function building the dictionaries of this kind of properties
+    handler = get_url_handler(url)
+
+    # page used to browse the website pages
+    context = await new_scraping_context(browser)
+    page = await context.new_page()
+
+    # pool of pages used to scrape the properties, each one in its own
+    # context so the currency selection of a page does not affect the others
+    worker_contexts = await asyncio.gather(
+        *[new_scraping_context(browser) for _ in range(n_workers)])
+    pool = asyncio.Queue()
+    for worker_page in await asyncio.gather(
+            *[worker_context.new_page()
+              for worker_context in worker_contexts]):
+        pool.put_nowait((worker_page, 0))
+
+    details = []
+    seen_links = set(done_links)
+    next_links = None
+    try:
+        for website_page in range(n_pages):
+            logger.info("Page: %s", website_page)
+            if next_links is None:
+                property_links = await obtain_links(page, url, website_page)
+            else:
+                property_links = await next_links
+                next_links = None
+
+            # browse the next website page while this one is being scraped
+            if website_page + 1 < n_pages:
+                next_links = asyncio.create_task(
+                    obtain_links(page, url, website_page + 1))
+
+            # skip the links already scraped, listings shift between pages
+            # when new properties are added during the scrape
+            property_links = [
+                link for link in dict.fromkeys(property_links)
+                if link not in seen_links]
+            seen_links.update(property_links)
+
+            results = await asyncio.gather(
+                *[scrape_link(pool, link, handler)
+                  for link in property_links])
+            page_details = [
+                detail for detail in results if detail is not None]
+            details.extend(page_details)
+
+            if checkpoint_file is not None:
+                append_checkpoint(page_details, checkpoint_file)
+
+    finally:
+        if next_links is not None:
+            next_links.cancel()
+            await asyncio.gather(next_links, return_exceptions=True)
+        for worker_context in [context, *worker_contexts]:
+            await worker_context.close()
+
+    return details
+
+
+async def main(browser, url_lands, url_villas, url_villas_rents):
     """ Main function """
-    # "with" statement for exception handling
-    with sync_playwright() as pw:
-        # creates an instance of the Chromium browser and launches it
-        browser = pw.chromium.launch(headless=True)
-        # creates a new browser page (tab) within the browser instance
-        page = browser.new_page()
+    # date of this scrape
+    now_str = dt.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
 
-        # Get last page to iterate
-        num_lands = get_last_page_number(page, url_lands)
-        num_villas = get_last_page_number(page, url_villas)
-        num_villas_rents = get_last_page_number(page, url_villas_rents)
+    # file keeping the scraped properties while the scrape runs, the
+    # properties already in it from a crashed run today are not scraped again
+    checkpoint_file = f"{PATH}/scraper/logs/details_{dt.date.today()}.csv"
+    checkpoint_details = read_checkpoint(checkpoint_file)
+    done_links = {detail['URL'] for detail in checkpoint_details}
 
-        try:
-            # Authenticate Google Sheet and open the worksheet
-            worksheet = google_authentication(
-                f"{PATH}/credentials.json",
-                os.getenv('SHEET_ID'))
-
-            # Check for old data in the Google
-            df_old = read_from_google(worksheet)
-
-            # Scrape new data
-            df_villas = scraper(
-                page,
-                url=URL_VILLAS,
+    # Get last page to iterate
+    num_lands, num_villas, num_villas_rents = await get_page_counts(
+        browser,
+        [url_lands, url_villas, url_villas_rents],
+        f"{PATH}/scraper/pagecount_cache.json")
+
+    try:
+        # Authenticate Google Sheet and open the worksheet
+        worksheet = google_authentication(
+            f"{PATH}/credentials.json",
+            os.getenv('SHEET_ID'))
+
+        # Check for old data in the Google
+        df_old = read_from_google(worksheet)
+
+        # Scrape new data, the three scrapes run concurrently
+        scrapes = [
+            asyncio.create_task(scraper(
+                browser,
+                url=url_villas,
                 n_pages=num_villas - 1,
-                flag=0)  # flag parameter is used to adapt the currency click
-            df_villas_rents = scraper(
-                page,
-                url=URL_VILLAS_RENTS,
+                checkpoint_file=checkpoint_file,
+                done_links=done_links)),
+            asyncio.create_task(scraper(
+                browser,
+                url=url_villas_rents,
                 n_pages=num_villas_rents - 1,
-                flag=1)
-            df_lands = scraper(
-                page,
-                url=URL_LANDS,
+                checkpoint_file=checkpoint_file,
+                done_links=done_links)),
+            asyncio.create_task(scraper(
+                browser,
+                url=url_lands,
                 n_pages=num_lands - 1,
-                flag=1)
+                checkpoint_file=checkpoint_file,
+                done_links=done_links))]
+        try:
+            villa_details, villa_rent_details, land_details = \
+                await asyncio.gather(*scrapes)
+        finally:
+            # stop the other scrapes when one of them fails, so they do not
+            # keep running against a browser that is about to be closed
+            for scrape in scrapes:
+                scrape.cancel()
+            await asyncio.gather(*scrapes, return_exceptions=True)
 
-            # Merge both
-            df_new = pd.concat([
-                df_villas,
-                df_villas_rents,
-                df_lands
-                ])
+        # Build a single data frame from the details of the three scrapes
+        # and the ones recovered from the checkpoint
+        df_new = pd.DataFrame.from_records(
+            checkpoint_details + villa_details + villa_rent_details
+            + land_details,
+            columns=column_order)
 
-            # Update dataframe
-            df_new = update_dataframe(df_new, df_old)
+        # Update dataframe
+        df_new = update_dataframe(df_new, df_old, now_str)
 
-            # apply reorder
-            df_new = df_new[column_order]
+        # apply reorder
+        df_new = df_new[column_order]
 
-            # fill NaN
-            df_new = df_new.fillna('Unlisted')
+        # fill NaN
+        df_new = df_new.fillna('Unlisted')
 
-            # Upload to Google Sheet with new information
-            upload_to_google(df_new, worksheet)
+        # Upload to Google Sheet with new information
+        upload_to_google(df_new, worksheet)
 
-        except Exception as error:
-            logger.info("%s: FAIL", str(error))
+        # the scrape is uploaded, a later run starts from scratch
+        if os.path.exists(checkpoint_file):
+            os.remove(checkpoint_file)
+
+    except Exception as error:
+        logger.info("%s: FAIL", str(error))
+
+
+async def run(url_lands, url_villas, url_villas_rents, trials=10):
+    """ This function launches the browser once and runs the main function
+    until it succeeds, relaunching the browser only if it crashed. """
+    # "with" statement for exception handling
+    async with async_playwright() as pw:
+        # creates an instance of the Chromium browser and launches it
+        browser = await pw.chromium.launch(
+            headless=True, args=_LAUNCH_ARGS)
+        try:
+            for _ in range(trials):
+                try:
+                    if not browser.is_connected():
+                        browser = await pw.chromium.launch(
+                            headless=True, args=_LAUNCH_ARGS)
+                    await main(
+                        browser, url_lands, url_villas, url_villas_rents)
+                    break
+                except Exception as error:
+                    logger.info("%s: FAIL", str(error))
+                    await asyncio.sleep(20)
+                    continue
 
         finally:
-            page.close()
+            await browser.close()
 
 
 if __name__ == '__main__':
@@ -703,12 +783,4 @@ if __name__ == '__main__':
     logger = logging.getLogger()
 
     # run main function
-    trials = 10
-    for trial in range(trials):
-        try:
-            main(URL_LANDS, URL_VILLAS, URL_VILLAS_RENTS)
-            break
-        except Exception as error:
-            logger.info("%s: FAIL", str(error))
-            time.sleep(20)
-            continue
+    asyncio.run(run(URL_LANDS, URL_VILLAS, URL_VILLAS_RENTS))